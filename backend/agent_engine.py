@@ -5,10 +5,14 @@ import re
 import ast
 import sys
 import subprocess
-import tempfile
 import platform
+import weakref
+import random
+import time
 from openai import AsyncOpenAI
 from dotenv import load_dotenv
+from complexity_analyzer import static_feasibility_screen
+from sandbox_pool import workspace_pool
 
 # 自动修正 Windows 系统代理
 for key in ["http_proxy", "https_proxy", "HTTP_PROXY", "HTTPS_PROXY"]:
@@ -140,6 +144,9 @@ SYSTEM_ARCHITECT_REVIEWER = """你是一个算法设计审查员。
 
 
 # V10.22: 动态 Coder Prompt，区分工程任务和算法题
+# 前缀稳定布局：system prompt 只依赖 (category, language, 是否锁定架构)，同类请求之间完全一致；
+# 架构方案等随任务变化的内容放入首条 user 消息（get_design_lock），修复轮次的变化内容追加在最后，
+# 以最大化 DeepSeek 上下文缓存（前缀命中）的 token 数。
 def get_coder_prompt(category, design_plan=None, language="cpp"):
     lang_specific = ""
     if language == "python":
@@ -175,16 +182,26 @@ def get_coder_prompt(category, design_plan=None, language="cpp"):
         return f"""你是一个执行力极强的 ACM/工程选手。
 {base}
 **最高指令（架构锁）**：
-你必须**严格执行**以下架构：
-【算法/模块】: {design_plan.get('algorithm', '未指定')}
-【数据结构】: {design_plan.get('data_structures', '未指定')}
-【步骤/蓝图】: {design_plan.get('blueprint', '未指定')}
+你必须**严格执行**对话开头【架构锁】给出的架构。
 
 **严禁擅自更换核心架构！**
 """
     return f"""你是一个资深工程师。{base} 要求代码健壮。"""
 
 
+def get_design_lock(design_plan):
+    """架构锁内容，放在首条 user 消息中（不进入 system prompt）。"""
+    if not design_plan:
+        return ""
+    return f"""
+【架构锁】
+【算法/模块】: {design_plan.get('algorithm', '未指定')}
+【数据结构】: {design_plan.get('data_structures', '未指定')}
+【步骤/蓝图】: {design_plan.get('blueprint', '未指定')}
+【头文件/依赖】: {design_plan.get('headers', '未指定')}
+【复杂度】: {design_plan.get('complexity', '未指定')}"""
+
+
 def get_prompts_by_category(category):
     if category == "problem":
         return {
@@ -271,8 +288,44 @@ SYSTEM_VISUALIZER = """生成 Mermaid JS 流程图 (graph TD)。
 # 2. 工具函数
 # ==========================================
 
+# LLM 用量统计：前缀缓存命中 token 数与首 token 延迟 (TTFT)
+llm_stats = {"calls": 0, "prompt_tokens": 0, "cache_hit_tokens": 0, "cache_miss_tokens": 0,
+             "ttft_total": 0.0, "ttft_count": 0, "latency_total": 0.0}
+
+
+def record_llm_usage(usage, latency=None, ttft=None):
+    if not usage: return
+    prompt = getattr(usage, "prompt_tokens", 0) or 0
+    # DeepSeek: prompt_cache_hit_tokens / prompt_cache_miss_tokens；OpenAI 兼容: prompt_tokens_details.cached_tokens
+    hit = getattr(usage, "prompt_cache_hit_tokens", None)
+    if hit is None:
+        hit = getattr(getattr(usage, "prompt_tokens_details", None), "cached_tokens", 0) or 0
+    miss = getattr(usage, "prompt_cache_miss_tokens", None)
+    if miss is None: miss = prompt - hit
+    llm_stats["calls"] += 1
+    llm_stats["prompt_tokens"] += prompt
+    llm_stats["cache_hit_tokens"] += hit
+    llm_stats["cache_miss_tokens"] += miss
+    if latency is not None: llm_stats["latency_total"] += latency
+    if ttft is not None:
+        llm_stats["ttft_total"] += ttft
+        llm_stats["ttft_count"] += 1
+    ttft_str = f" ttft={ttft:.2f}s" if ttft is not None else ""
+    print(f">> LLM Usage: prompt={prompt} cache_hit={hit} ({hit / max(prompt, 1):.0%}){ttft_str}")
+
+
+def get_llm_stats():
+    return {
+        **llm_stats,
+        "cache_hit_rate": round(llm_stats["cache_hit_tokens"] / max(llm_stats["prompt_tokens"], 1), 4),
+        "avg_ttft": round(llm_stats["ttft_total"] / max(llm_stats["ttft_count"], 1), 3),
+        "avg_latency": round(llm_stats["latency_total"] / max(llm_stats["calls"], 1), 3),
+    }
+
+
 async def call_llm(system_prompt, user_content, json_mode=False, temperature=1.0):
     try:
+        start = time.perf_counter()
         response = await client.chat.completions.create(
             model="deepseek-chat",
             messages=[{"role": "system", "content": system_prompt}, {"role": "user", "content": user_content}],
@@ -280,6 +333,7 @@ async def call_llm(system_prompt, user_content, json_mode=False, temperature=1.0
             temperature=temperature,
             timeout=60
         )
+        record_llm_usage(response.usage, latency=time.perf_counter() - start)
         return response.choices[0].message.content
     except Exception as e:
         print(f">> LLM Error: {e}")
@@ -288,6 +342,7 @@ async def call_llm(system_prompt, user_content, json_mode=False, temperature=1.0
 
 async def call_llm_direct(messages, json_mode=False, temperature=1.0):
     try:
+        start = time.perf_counter()
         response = await client.chat.completions.create(
             model="deepseek-chat",
             messages=messages,
@@ -295,6 +350,7 @@ async def call_llm_direct(messages, json_mode=False, temperature=1.0):
             temperature=temperature,
             timeout=60
         )
+        record_llm_usage(response.usage, latency=time.perf_counter() - start)
         return response.choices[0].message.content
     except Exception as e:
         print(f">> LLM Error: {e}")
@@ -304,16 +360,26 @@ async def call_llm_direct(messages, json_mode=False, temperature=1.0):
 async def call_llm_stream(system_prompt, messages_history, temperature=1.0):
     try:
         full_messages = [{"role": "system", "content": system_prompt}] + messages_history
+        start = time.perf_counter()
+        ttft = None
         stream = await client.chat.completions.create(
-            model="deepseek-chat", messages=full_messages, stream=True, temperature=temperature, timeout=60
+            model="deepseek-chat", messages=full_messages, stream=True, temperature=temperature, timeout=60,
+            stream_options={"include_usage": True}
         )
         full_content = ""
+        extractor = StreamingCodeExtractor()
         async for chunk in stream:
-            if chunk.choices[0].delta.content:
+            # 最后一个 chunk 只携带 usage，choices 为空
+            if getattr(chunk, "usage", None):
+                record_llm_usage(chunk.usage, latency=time.perf_counter() - start, ttft=ttft)
+            if chunk.choices and chunk.choices[0].delta.content:
+                if ttft is None: ttft = time.perf_counter() - start
                 content = chunk.choices[0].delta.content
                 full_content += content
                 yield {"phase": "code_chunk", "content": content}
-        yield {"phase": "stream_finished", "full_content": full_content}
+                for code in extractor.feed(content):
+                    yield {"phase": "code_block_closed", "code": code, "full_content": full_content}
+        yield {"phase": "stream_finished", "full_content": full_content, "code": extractor.result()}
     except Exception as e:
         yield {"phase": "log", "content": f"⚠️ 网络中断: {str(e)[:50]}..."}
 
@@ -330,17 +396,25 @@ def detect_language(text):
     return "cpp"
 
 
+def select_code_block(blocks):
+    valid = [m.strip() for m in blocks if len(m.strip()) > 20]
+    for m in valid:
+        if re.search(r"int\s+main", m): return m
+    for m in valid:
+        if re.search(r"if\s+__name__", m): return m
+    if valid: return valid[-1]
+    return ""
+
+
 def extract_code_content(text):
     pattern = r"```(?:\w+)?\n([\s\S]*?)(?:```|$)"
     matches = re.findall(pattern, text, re.DOTALL)
-    if matches:
-        valid = [m.strip() for m in matches if len(m.strip()) > 20]
-        for m in valid:
-            if re.search(r"int\s+main", m): return m
-        for m in valid:
-            if re.search(r"if\s+__name__", m): return m
-        if valid: return valid[-1]
+    selected = select_code_block(matches)
+    if selected: return selected
+    return extract_unfenced_code(text)
 
+
+def extract_unfenced_code(text):
     cpp_match = re.search(r"(#include\s*<|int\s+main\s*\()", text)
     if cpp_match:
         return text[cpp_match.start():].strip()
@@ -350,6 +424,62 @@ def extract_code_content(text):
     return ""
 
 
+class StreamingCodeExtractor:
+    """
+    增量代码块提取：跨 code_chunk 跟踪 ``` 围栏边界，语义与 extract_code_content 的正则一致，
+    但每个字符只扫描一次。feed() 返回本次新闭合、且包含 main 入口的代码块（可提前编译）。
+    """
+
+    def __init__(self):
+        self.buf = ""
+        self.pos = 0  # outside: 下一个待检查的围栏起点；inside: 下一个待检查的闭合位置
+        self.content_start = None  # 不为 None 表示处于代码块内部
+        self.blocks = []
+        self.entry_emitted = False
+
+    def feed(self, delta):
+        self.buf += delta
+        closed = []
+        while True:
+            if self.content_start is None:
+                i = self.buf.find("```", self.pos)
+                if i < 0:
+                    self.pos = max(self.pos, len(self.buf) - 2)
+                    break
+                j = i + 3
+                while j < len(self.buf) and re.match(r"\w", self.buf[j]):
+                    j += 1
+                if j >= len(self.buf):
+                    self.pos = i  # 语言标记尚未收完，等待后续数据
+                    break
+                if self.buf[j] == "\n":
+                    self.content_start = self.pos = j + 1
+                else:
+                    self.pos = i + 1
+            else:
+                i = self.buf.find("```", self.pos)
+                if i < 0:
+                    self.pos = max(self.content_start, len(self.buf) - 2)
+                    break
+                block = self.buf[self.content_start:i]
+                self.blocks.append(block)
+                self.content_start, self.pos = None, i + 3
+                closed.append(block)
+
+        entries = []
+        for block in closed:
+            code = block.strip()
+            if not self.entry_emitted and len(code) > 20 and re.search(r"int\s+main|if\s+__name__", code):
+                self.entry_emitted = True
+                entries.append(code)
+        return entries
+
+    def result(self):
+        """流结束后的最终代码，与 extract_code_content(全文) 结果一致。"""
+        blocks = self.blocks + ([self.buf[self.content_start:]] if self.content_start is not None else [])
+        return select_code_block(blocks) or extract_unfenced_code(self.buf)
+
+
 def detect_code_block(text):
     has_markdown = "```" in text
     has_cpp = bool(re.search(r"(#include|int\s+main\s*\()", text))
@@ -357,6 +487,78 @@ def detect_code_block(text):
     return has_markdown or has_cpp or has_py
 
 
+# --- 本地快速意图识别 (Fast Path) ---
+# 置信度达到阈值时跳过 SYSTEM_CLASSIFIER 调用；SHADOW_RATE 为高置信样本仍抽样交给 LLM 复核的比例
+LOCAL_CLASSIFIER_THRESHOLD = float(os.getenv("LOCAL_CLASSIFIER_THRESHOLD", "0.85"))
+CLASSIFIER_SHADOW_RATE = float(os.getenv("CLASSIFIER_SHADOW_RATE", "0.0"))
+
+PROBLEM_MARKERS = [
+    r"输入格式", r"输出格式", r"输入样例", r"输出样例", r"样例输入", r"样例输出", r"样例",
+    r"时间限制", r"内存限制", r"数据范围", r"数据规模",
+    r"\bInput\b", r"\bOutput\b", r"\bSample\b", r"\bConstraints?\b",
+    r"\d+\s*(?:<=|≤|<)\s*[A-Za-z]\w*\s*(?:<=|≤|<)", r"10\^\d+|1e\d+",
+]
+TASK_MARKERS = [
+    r"写(?:一)?个", r"开发", r"实现一个", r"做一个", r"网站", r"网页", r"游戏", r"脚本", r"工具",
+    r"系统", r"爬虫", r"界面", r"GUI", r"小程序", r"数据分析", r"可视化",
+]
+
+classifier_stats = {"total": 0, "agree": 0, "buckets": {}}
+
+
+def detect_requested_language(text):
+    if re.search(r"python|\bpy\b|派森", text, re.IGNORECASE): return "python"
+    if re.search(r"c\+\+|cpp", text, re.IGNORECASE): return "cpp"
+    return None
+
+
+def classify_locally(text):
+    """
+    基于规则与特征的本地意图识别，复用 detect_code_block / extract_code_content。
+    返回 {"type", "language", "confidence", "code"}，code 为检测到的用户代码（无则为空）。
+    """
+    if detect_code_block(text):
+        extracted = extract_code_content(text)
+        if len(extracted) > 20:
+            return {"type": "code", "language": detect_language(extracted), "confidence": 0.95, "code": extracted}
+
+    problem_hits = sum(1 for p in PROBLEM_MARKERS if re.search(p, text))
+    task_hits = sum(1 for p in TASK_MARKERS if re.search(p, text, re.IGNORECASE))
+    requested_lang = detect_requested_language(text)
+
+    if problem_hits >= 2 and problem_hits > task_hits:
+        category, confidence = "problem", min(0.6 + 0.1 * problem_hits, 0.98)
+    elif task_hits >= 1 and problem_hits == 0:
+        category, confidence = "task", min(0.7 + 0.1 * task_hits, 0.95)
+    elif problem_hits > task_hits:
+        category, confidence = "problem", 0.5
+    else:
+        category, confidence = "task", 0.3
+
+    # 未指明语言时沿用 LLM 的惯常选择：算法题 C++，工程任务 Python，但置信度打折
+    if requested_lang:
+        language = requested_lang
+    else:
+        language = "cpp" if category == "problem" else "python"
+        confidence *= 0.9
+
+    return {"type": category, "language": language, "confidence": round(confidence, 2), "code": ""}
+
+
+def record_classifier_agreement(local_cls, llm_cls):
+    """记录本地识别与 LLM 识别的一致率（按置信度分桶），用于调整阈值。"""
+    agree = local_cls["type"] == llm_cls.get("type") and local_cls["language"] == llm_cls.get("language", "cpp")
+    bucket = f"{int(local_cls['confidence'] * 10) / 10:.1f}"
+    stats = classifier_stats["buckets"].setdefault(bucket, {"total": 0, "agree": 0})
+    for s in (classifier_stats, stats):
+        s["total"] += 1
+        s["agree"] += int(agree)
+    print(f">> Classifier: local={local_cls['type']}/{local_cls['language']}@{local_cls['confidence']} "
+          f"llm={llm_cls.get('type')}/{llm_cls.get('language')} agree={agree} "
+          f"rate={classifier_stats['agree']}/{classifier_stats['total']} bucket[{bucket}]={stats['agree']}/{stats['total']}")
+    return agree
+
+
 def generate_mermaid_from_json(json_str):
     try:
         data = json.loads(clean_json_text(json_str))
@@ -423,50 +625,110 @@ def normalize_output(text):
     return '\n'.join(lines).strip()
 
 
-def run_code(code_str, language, input_str):
-    with tempfile.NamedTemporaryFile(mode='w', suffix=f'.{language.replace("python", "py")}', delete=False,
-                                     encoding='utf-8') as tmp:
-        tmp.write(code_str)
-        tmp_path = tmp.name
+# 与工作区池同大小的信号量：在事件循环中等待空闲槽位，线程池线程不会阻塞在取槽位上
+SANDBOX_SLOTS = asyncio.Semaphore(workspace_pool.size)
+
+
+def _release_sandbox_slot(workdir, loop):
+    # 可能在任意线程中由垃圾回收触发，信号量只能回到事件循环线程释放
+    workspace_pool.release(workdir)
     try:
-        if language == "python":
-            cmd = [sys.executable, tmp_path]
-        else:  # cpp
-            exe = tmp_path + ".exe"
+        loop.call_soon_threadsafe(SANDBOX_SLOTS.release)
+    except RuntimeError:  # 事件循环已关闭
+        pass
+
+
+class SandboxProgram:
+    """
+    在工作区池借用的槽位目录中（优先位于 tmpfs）写入并编译一次，可多次运行。
+    需在事件循环中持有 SANDBOX_SLOTS 后创建（见 open_program），编译与运行放到线程中执行。
+    用完调用 close() 归还槽位；对象被回收时也会自动归还。
+    """
+
+    def __init__(self, code_str, language, waited=0.0):
+        self.code = code_str
+        self.language = language
+        # 调用方已持有信号量，必有空闲槽位
+        self.workdir = workspace_pool.acquire_nowait(waited)
+        self._release = weakref.finalize(self, _release_sandbox_slot, self.workdir, asyncio.get_running_loop())
+        self.cmd, self.error = None, "Not built"
+
+    def prepare(self, first_input=None):
+        """编译程序，并可选地立即运行首个样例，返回 ((stdout, stderr), 运行耗时) 或 None。"""
+        self.cmd, self.error = self._build()
+        if first_input is None:
+            return None
+        start = time.perf_counter()
+        result = self.run(first_input)
+        return result, time.perf_counter() - start
+
+    def _build(self):
+        try:
+            if self.language == "python":
+                src = os.path.join(self.workdir, "main.py")
+                with open(src, "w", encoding="utf-8") as f:
+                    f.write(self.code)
+                return [sys.executable, src], None
+            # cpp
+            src = os.path.join(self.workdir, "main.cpp")
+            exe = os.path.join(self.workdir, "main.exe")
+            with open(src, "w", encoding="utf-8") as f:
+                f.write(self.code)
             compile_res = subprocess.run(
-                ["g++", tmp_path, "-o", exe],
+                ["g++", src, "-o", exe],
                 capture_output=True
             )
             if compile_res.returncode != 0:
                 err_msg = compile_res.stderr.decode(errors='replace')
-                return "", f"Compile Error: {err_msg}"
-            cmd = [exe]
-
-        result = subprocess.run(
-            cmd,
-            input=input_str.encode(),
-            capture_output=True,
-            timeout=5
-        )
-
-        stdout = result.stdout.decode(errors='replace')
-        stderr = result.stderr.decode(errors='replace')
-        return normalize_output(stdout), normalize_output(stderr)
+                return None, f"Compile Error: {err_msg}"
+            return [exe], None
+        except Exception as e:
+            return None, str(e)
 
-    except subprocess.TimeoutExpired:
-        return "", "Timeout"
-    except Exception as e:
-        return "", str(e)
-    finally:
+    def run(self, input_str):
+        if self.error:
+            return "", self.error
         try:
-            os.remove(tmp_path)
-        except:
-            pass
-        if language == "cpp" and os.path.exists(tmp_path + ".exe"):
-            try:
-                os.remove(tmp_path + ".exe")
-            except:
-                pass
+            result = subprocess.run(
+                self.cmd,
+                input=input_str.encode(),
+                capture_output=True,
+                timeout=5,
+                cwd=self.workdir
+            )
+
+            stdout = result.stdout.decode(errors='replace')
+            stderr = result.stderr.decode(errors='replace')
+            return normalize_output(stdout), normalize_output(stderr)
+
+        except subprocess.TimeoutExpired:
+            return "", "Timeout"
+        except Exception as e:
+            return "", str(e)
+
+    def close(self):
+        self._release()
+
+
+async def open_program(code_str, language, first_input=None):
+    """
+    在事件循环中等待槽位，再到线程中编译（并可选地运行首个样例）。
+    返回 (program, 首个样例的 (结果, 耗时) 或 None)；program 用完必须 close()。
+    中途被取消时，线程结束后 program 被回收，槽位随之归还。
+    """
+    start = time.perf_counter()
+    await SANDBOX_SLOTS.acquire()
+    try:
+        program = SandboxProgram(code_str, language, time.perf_counter() - start)
+    except BaseException:
+        SANDBOX_SLOTS.release()
+        raise
+    first_result = await asyncio.to_thread(program.prepare, first_input)
+    return program, first_result
+
+
+# 快速失败：遇到首个失败样例即停止本轮测试，只把该失败交给 SYSTEM_DEBUGGER
+TEST_FAIL_FAST = os.getenv("TEST_FAIL_FAST", "1") != "0"
 
 
 # ==========================================
@@ -477,10 +739,35 @@ async def workflow_orchestrator(user_task: str):
     def log(msg):
         return {"phase": "log", "content": msg}
 
+    # 阶段计时：每个阶段结束时发出 timing 事件（前端忽略，批量评测用于统计耗时）
+    stage_clock = [time.perf_counter()]
+
+    def case_order():
+        # 回归感知排序：上次失败的样例优先，其次按耗时从长到短；首轮保持原顺序（sorted 稳定）
+        return sorted(range(len(test_cases)),
+                      key=lambda i: (not case_history.get(i, {}).get("failed", False),
+                                     -case_history.get(i, {}).get("duration", 0.0)))
+
+    def start_early_compile(packet):
+        # 代码块一闭合就开始编译并运行首个样例，与剩余的流式输出（如结尾说明文字）并行
+        if not test_cases or task_category == "task":
+            return None
+        first_input = str(test_cases[case_order()[0]].get("input", ""))
+        lang = detect_language(packet["full_content"])
+        return asyncio.create_task(open_program(packet["code"], lang, first_input))
+
+    def timing(stage):
+        now = time.perf_counter()
+        cost, stage_clock[0] = now - stage_clock[0], now
+        return {"phase": "timing", "content": {"stage": stage, "seconds": round(cost, 3)}}
+
     yield log("核心初始化...")
 
     current_code_raw = ""
+    current_pure_code = ""
+    early_job = None
     test_cases = []
+    case_history = {}  # 样例下标 -> {"failed": 上一次是否失败, "duration": 上一次耗时}
     chat_history = []
     target_language = "cpp"
     approved_design = None
@@ -491,22 +778,31 @@ async def workflow_orchestrator(user_task: str):
     yield log("分析任务意图...")
     task_category = "task"
     try:
-        cls_res = await call_llm(SYSTEM_CLASSIFIER, user_task, json_mode=True)
-        cls_data = json.loads(clean_json_text(cls_res))
-        task_category = cls_data.get("type", "task")
-        target_language = cls_data.get("language", "cpp")
-
-        if detect_code_block(user_task):
-            extracted = extract_code_content(user_task)
-            if len(extracted) > 20:
-                current_code_raw = extracted
-                task_category = "code"
-                target_language = detect_language(current_code_raw)
-                yield log("⚡ 检测到用户代码，进入混合模式...")
+        local_cls = classify_locally(user_task)
+        task_category, target_language = local_cls["type"], local_cls["language"]
+
+        if local_cls["confidence"] >= LOCAL_CLASSIFIER_THRESHOLD and random.random() >= CLASSIFIER_SHADOW_RATE:
+            yield log(f"⚡ 本地快速识别 (置信度 {local_cls['confidence']:.2f})")
+        else:
+            cls_res = await call_llm(SYSTEM_CLASSIFIER, user_task, json_mode=True)
+            cls_data = json.loads(clean_json_text(cls_res))
+            # call_llm 失败时返回 "{}"，此时保留本地结果，也不计入一致率统计
+            if cls_data.get("type"):
+                record_classifier_agreement(local_cls, cls_data)
+                task_category = cls_data["type"]
+                target_language = cls_data.get("language", "cpp")
+
+        # 检测到用户代码时始终以本地结果为准
+        if local_cls["code"]:
+            current_code_raw = local_cls["code"]
+            task_category = "code"
+            target_language = local_cls["language"]
+            yield log("⚡ 检测到用户代码，进入混合模式...")
     except:
         pass
 
     yield log(f"模式识别: {task_category.upper()} | 目标语言: {target_language.upper()}")
+    yield timing("classify")
     STRATEGIES = get_prompts_by_category(task_category)
 
     # 2. 提取样例
@@ -518,18 +814,31 @@ async def workflow_orchestrator(user_task: str):
             if test_cases: yield log(f"提取到 {len(test_cases)} 个测试样例。")
         except:
             pass
+        yield timing("extract_tests")
 
     # 3. 架构设计 (Strategic Pivot)
     if current_code_raw:
         yield log("🔍 分析用户代码架构...")
         try:
-            rev_res = await call_llm(SYSTEM_REVERSE_ARCHITECT, current_code_raw, json_mode=True)
-            user_design = json.loads(clean_json_text(rev_res))
+            # 静态复杂度预检：只有确定超时时才跳过逆向分析与 LLM 评估（省两次调用）；
+            # 判定可行不省调用，LLM 仍需判断算法思路，只是不必再评估复杂度
+            screen = static_feasibility_screen(current_code_raw, target_language, user_task)
+            if screen:
+                yield log(f"📏 静态复杂度预检: {screen['analysis']['estimate']}，{'可行' if screen['pass'] else '超时'}")
+
+            user_design = {}
+            if screen and not screen["pass"]:
+                feasibility = screen
+            else:
+                rev_res = await call_llm(SYSTEM_REVERSE_ARCHITECT, current_code_raw, json_mode=True)
+                user_design = json.loads(clean_json_text(rev_res))
 
-            yield log("⚖️ 评估算法可行性...")
-            feasibility_res = await call_llm(SYSTEM_FEASIBILITY_ANALYST, f"题目:{user_task}\n当前设计:{rev_res}",
-                                             json_mode=True)
-            feasibility = json.loads(clean_json_text(feasibility_res))
+                yield log("⚖️ 评估算法可行性...")
+                feasibility_input = f"题目:{user_task}\n当前设计:{rev_res}"
+                if screen:
+                    feasibility_input += f"\n【静态预检】{screen['reason']} 复杂度无需再评估，只判断算法思路是否正确。"
+                feasibility_res = await call_llm(SYSTEM_FEASIBILITY_ANALYST, feasibility_input, json_mode=True)
+                feasibility = json.loads(clean_json_text(feasibility_res))
 
             if feasibility.get("pass"):
                 approved_design = user_design
@@ -566,27 +875,34 @@ async def workflow_orchestrator(user_task: str):
                     break
         except:
             pass
+    yield timing("design")
 
     # 4. 代码生成
     if current_code_raw:
         target_language = detect_language(current_code_raw)
+    # 整轮复用同一个 system prompt，保证修复轮次共享最长前缀
+    coder_sys_prompt = get_coder_prompt(task_category, approved_design, language=target_language)
+    if current_code_raw:
         chat_history.append(
-            {"role": "user", "content": f"题目/需求如下，包含我的代码:\n{user_task}\n\n请帮我检查并完善代码。"})
+            {"role": "user", "content": f"题目/需求如下，包含我的代码:\n{user_task}\n\n请帮我检查并完善代码。{get_design_lock(approved_design)}"})
         wrapped_code = f"```{target_language}\n{current_code_raw}\n```"
         chat_history.append({"role": "assistant", "content": wrapped_code})
+        current_pure_code = extract_code_content(current_code_raw)
         yield {"phase": "final_code", "content": {"code": wrapped_code}}
         yield log("已装载代码，开始审查...")
     else:
         yield log("🏗️ 构建工程代码...")
-        coder_sys_prompt = get_coder_prompt(task_category, approved_design, language=target_language)
-        design_str = f"\n【已锁定的架构方案】\n{json.dumps(approved_design, ensure_ascii=False)}" if approved_design else ""
-        chat_history.append({"role": "user", "content": f"需求: {user_task}{design_str}"})
+        chat_history.append({"role": "user", "content": f"需求: {user_task}{get_design_lock(approved_design)}"})
         async for packet in call_llm_stream(coder_sys_prompt, chat_history):
             if packet["phase"] == "code_chunk":
                 yield packet
+            elif packet["phase"] == "code_block_closed":
+                early_job = start_early_compile(packet)
             elif packet["phase"] == "stream_finished":
                 current_code_raw = packet["full_content"]
+                current_pure_code = packet["code"]
                 chat_history.append({"role": "assistant", "content": current_code_raw})
+    yield timing("generate")
 
     # 5. 循环审查
     max_retries = 4
@@ -595,18 +911,20 @@ async def workflow_orchestrator(user_task: str):
     for attempt in range(max_retries + 1):
         round_num = attempt + 1
         current_lang = detect_language(current_code_raw)
-        pure_code = extract_code_content(current_code_raw)
+        pure_code = current_pure_code
 
         if not pure_code:
             yield log("⚠️ 代码提取失败，重试...")
             chat_history.append({"role": "user", "content": "错误：未检测到代码块。请输出 ```cpp 或 ```python。"})
             yield {"phase": "clear_code", "content": ""}
-            async for packet in call_llm_stream(
-                    get_coder_prompt(task_category, approved_design, language=target_language), chat_history):
+            async for packet in call_llm_stream(coder_sys_prompt, chat_history):
                 if packet["phase"] == "code_chunk":
                     yield packet
+                elif packet["phase"] == "code_block_closed":
+                    early_job = start_early_compile(packet)
                 elif packet["phase"] == "stream_finished":
                     current_code_raw = packet["full_content"]
+                    current_pure_code = packet["code"]
                     chat_history.append({"role": "assistant", "content": current_code_raw})
             continue
 
@@ -615,38 +933,71 @@ async def workflow_orchestrator(user_task: str):
         run_passed = True
         run_report = ""
         if test_cases and current_lang != "unknown" and task_category != "task":
-            for idx, case in enumerate(test_cases):
-                inp, exp = str(case.get("input", "")), normalize_output(str(case.get("output", "")))
-                act, err = run_code(pure_code, current_lang, inp)
-                if err:
-                    run_passed = False
-                    run_report += f"[Case {idx + 1} Error] {err}\n"
-                    yield log(f"❌ 样例 {idx + 1} 报错")
-                elif act != exp:
-                    run_passed = False
-                    run_report += f"[Case {idx + 1} Fail]\nExpected:\n{exp[:150]}\nActual:\n{act[:150]}\n"
-                    yield log(f"❌ 样例 {idx + 1} 不匹配")
-                else:
-                    yield log(f"✅ 样例 {idx + 1} 通过")
+            # 沙箱执行放入线程池，避免并发任务时阻塞事件循环；每轮只编译一次
+            program, first_result = None, None
+            if early_job:
+                try:
+                    program, first_result = await early_job
+                except Exception:
+                    program = None
+                if program and (program.code, program.language) != (pure_code, current_lang):
+                    program.close()
+                    program, first_result = None, None
+                if program:
+                    yield log("⚡ 复用流式阶段的提前编译结果")
+            early_job = None
+            if program is None:
+                program, _ = await open_program(pure_code, current_lang)
+            try:
+                # 快速失败模式下，只有全部样例都跑过且通过才算 run_passed，验收前必然经过一次完整测试
+                order = case_order()
+                for pos, idx in enumerate(order):
+                    case = test_cases[idx]
+                    inp, exp = str(case.get("input", "")), normalize_output(str(case.get("output", "")))
+                    stats = case_history.setdefault(idx, {})
+                    if pos == 0 and first_result:
+                        (act, err), stats["duration"] = first_result
+                    else:
+                        case_start = time.perf_counter()
+                        act, err = await asyncio.to_thread(program.run, inp)
+                        stats["duration"] = time.perf_counter() - case_start
+                    stats["failed"] = bool(err) or act != exp
+                    if err:
+                        run_passed = False
+                        run_report += f"[Case {idx + 1} Error] {err}\n"
+                        yield log(f"❌ 样例 {idx + 1} 报错")
+                    elif act != exp:
+                        run_passed = False
+                        run_report += f"[Case {idx + 1} Fail]\nExpected:\n{exp[:150]}\nActual:\n{act[:150]}\n"
+                        yield log(f"❌ 样例 {idx + 1} 不匹配")
+                    else:
+                        yield log(f"✅ 样例 {idx + 1} 通过")
+                    if stats["failed"] and TEST_FAIL_FAST and pos < len(order) - 1:
+                        yield log(f"⏩ 快速失败：跳过剩余 {len(order) - pos - 1} 个样例")
+                        break
+            finally:
+                program.close()
         else:
             if task_category == "task":
                 run_report = "任务模式：跳过自动测试。"
             else:
                 run_report = "无测试样例。"
+        yield timing("test")
 
         yield log("🔍 专家审查中...")
         review_json = {}
         try:
             if not run_passed:
-                debug_input = f"""代码:
-{pure_code}
+                # 固定内容在前，每轮变化的代码与错误报告在后
+                debug_input = f"""需求: {user_task}
 
-错误:
-{run_report}
+【注意】请仔细对比 Expected 和 Actual 的差异（如空格、换行、多余的提示文字）。
 
-需求: {user_task}
+代码:
+{pure_code}
 
-【注意】请仔细对比 Expected 和 Actual 的差异（如空格、换行、多余的提示文字）。"""
+错误:
+{run_report}"""
                 debug_resp = await call_llm(SYSTEM_DEBUGGER, debug_input, json_mode=True)
                 debug_json = json.loads(clean_json_text(debug_resp))
                 review_json = {
@@ -686,6 +1037,7 @@ async def workflow_orchestrator(user_task: str):
                 previous_score = current_score
         except Exception as e:
             review_json = {"pass": False, "score": 0, "critique": f"审查异常: {str(e)}"}
+        yield timing("review")
 
         yield {
             "phase": "iteration",
@@ -705,25 +1057,26 @@ async def workflow_orchestrator(user_task: str):
                 yield log(f"得分 {effective_score}，触发{'深度打磨' if is_user_first_run else '修正'}...")
 
                 fix_temp = 0.7 if not run_passed else 0.0
-                refine_instruction = ""
+                # 固定指令与架构警报在前，本轮的审查意见/测试报告追加在最后
+                lock_alert = f"\n**警报**：严禁更改【{approved_design.get('algorithm')}】算法框架！" if approved_design else ""
 
                 if is_user_first_run:
-                    refine_instruction = f"代码功能已通过测试。现在请**优化代码风格**：\n1. 规范变量命名。\n2. 添加详细中文注释。\n3. 优化代码结构（保持功能不变）。\n问题参考: {review_json['critique']}"
+                    refine_instruction = f"代码功能已通过测试。现在请**优化代码风格**：\n1. 规范变量命名。\n2. 添加详细中文注释。\n3. 优化代码结构（保持功能不变）。{lock_alert}\n\n问题参考: {review_json['critique']}"
                 else:
-                    refine_instruction = f"问题:\n{review_json['critique']}\n\n报告:\n{run_report}\n\n请修改代码。保持使用 {target_language}。"
-
-                if approved_design: refine_instruction += f"\n\n**警报**：严禁更改【{approved_design.get('algorithm')}】算法框架！"
+                    refine_instruction = f"请修改代码。保持使用 {target_language}。{lock_alert}\n\n问题:\n{review_json['critique']}\n\n报告:\n{run_report}"
 
                 chat_history.append({"role": "user", "content": refine_instruction})
                 yield {"phase": "clear_code", "content": ""}
-                async for packet in call_llm_stream(
-                        get_coder_prompt(task_category, approved_design, language=target_language), chat_history,
-                        temperature=fix_temp):
+                async for packet in call_llm_stream(coder_sys_prompt, chat_history, temperature=fix_temp):
                     if packet["phase"] == "code_chunk":
                         yield packet
+                    elif packet["phase"] == "code_block_closed":
+                        early_job = start_early_compile(packet)
                     elif packet["phase"] == "stream_finished":
                         current_code_raw = packet["full_content"]
+                        current_pure_code = packet["code"]
                         chat_history.append({"role": "assistant", "content": current_code_raw})
+                yield timing("refine")
             else:
                 yield log("已达最大重试次数。")
                 final_review = review_json
@@ -738,7 +1091,7 @@ async def workflow_orchestrator(user_task: str):
 
     yield log("生成进阶建议...")
     try:
-        improver_res = await call_llm(SYSTEM_IMPROVER, f"代码:\n{extract_code_content(current_code_raw)}",
+        improver_res = await call_llm(SYSTEM_IMPROVER, f"代码:\n{current_pure_code}",
                                       json_mode=True)
         improver_json = json.loads(clean_json_text(improver_res))
         final_review["critique"] = improver_json.get("critique", "无建议")
@@ -749,7 +1102,7 @@ async def workflow_orchestrator(user_task: str):
     yield {"phase": "final_code_update", "content": {"review": final_review}}
 
     yield log("生成深度解析报告...")
-    final_pure_code = extract_code_content(current_code_raw)
+    final_pure_code = current_pure_code
 
     async def task_viz():
         json_str = await call_llm(SYSTEM_VISUALIZER, f"代码:\n{final_pure_code}", json_mode=True, temperature=0.0)
@@ -784,6 +1137,7 @@ async def workflow_orchestrator(user_task: str):
 
     except Exception as e:
         yield log(f"Final Report Error: {e}")
+    yield timing("report")
 
     yield log("任务完成。")
     yield {"phase": "done", "content": ""}
\ No newline at end of file
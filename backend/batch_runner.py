@@ -0,0 +1,166 @@
+"""
+批量评测：读取 JSONL 任务文件，以有限并发跑 workflow_orchestrator，
+每完成一个任务就向结果文件追加一行 JSONL 记录。
+
+任务文件每行: {"id": "可选，缺省为行号", "task": "题目/需求文本"}
+结果文件每行: {"id", "task", "passed", "score", "rounds", "code", "timings", "elapsed", "error"}
+
+结果文件同时充当断点：重新运行时会跳过已有记录的 id，被中断的批次可直接续跑。
+运行中抛出异常（error 非空）的记录不算完成，续跑时会重试；同一 id 有多条记录时以最后一条为准。
+
+用法: python batch_runner.py tasks.jsonl -o results.jsonl -c 4
+HTTP 接口 /batch 中的文件名一律相对于 BATCH_DIR 解析。
+"""
+import argparse
+import asyncio
+import json
+import os
+import time
+
+from agent_engine import workflow_orchestrator, extract_code_content
+
+# /batch 接口只允许读写该目录下的文件（CLI 不受限制）
+BATCH_DIR = os.path.abspath(os.getenv("BATCH_DIR", "batch_tasks"))
+# /batch 接口单个请求允许的最大并发任务数
+BATCH_MAX_CONCURRENCY = int(os.getenv("BATCH_MAX_CONCURRENCY", "16"))
+
+
+def resolve_batch_path(name):
+    """把 /batch 请求中的文件名解析到 BATCH_DIR 内；拒绝绝对路径与 .. 跳出目录。"""
+    if not name or os.path.isabs(name) or os.path.splitdrive(name)[0] or \
+            ".." in name.replace("\\", "/").split("/"):
+        raise ValueError(f"非法的批量文件路径: {name}")
+    path = os.path.realpath(os.path.join(BATCH_DIR, name))
+    if os.path.commonpath([path, os.path.realpath(BATCH_DIR)]) != os.path.realpath(BATCH_DIR):
+        raise ValueError(f"非法的批量文件路径: {name}")
+    return path
+
+
+def load_tasks(tasks_file):
+    tasks = []
+    with open(tasks_file, encoding="utf-8") as f:
+        for line_no, line in enumerate(f, 1):
+            line = line.strip()
+            if not line:
+                continue
+            try:
+                item = json.loads(line)
+            except json.JSONDecodeError:
+                print(f">> Batch: 跳过第 {line_no} 行（JSON 解析失败）")
+                continue
+            if isinstance(item, str):
+                item = {"task": item}
+            if not isinstance(item, dict) or not item.get("task"):
+                print(f">> Batch: 跳过第 {line_no} 行（缺少 task 字段）")
+                continue
+            tasks.append({"id": str(item.get("id", line_no)), "task": item["task"]})
+    return tasks
+
+
+def load_finished_ids(output_file):
+    """读取已写出的结果，用于断点续跑。半截写入的最后一行与带 error 的记录会被忽略（续跑时重试）。"""
+    finished = set()
+    if not os.path.exists(output_file):
+        return finished
+    with open(output_file, encoding="utf-8") as f:
+        for line in f:
+            try:
+                record = json.loads(line)
+                if record.get("error") is None:
+                    finished.add(str(record["id"]))
+            except (json.JSONDecodeError, KeyError, TypeError, AttributeError):
+                continue
+    return finished
+
+
+async def run_single(task_id, user_task):
+    """完整跑一遍工作流，把事件流归纳成一条结果记录。"""
+    record = {"id": task_id, "task": user_task, "passed": False, "score": 0, "rounds": 0,
+              "code": "", "timings": {}, "elapsed": 0.0, "error": None}
+    code_raw = ""
+    failed = False
+    finished = False
+    start = time.perf_counter()
+    try:
+        async for event in workflow_orchestrator(user_task):
+            phase = event.get("phase")
+            if phase == "final_code":
+                code_raw = event["content"].get("code", "")
+            elif phase == "iteration":
+                record["rounds"] = event["data"]["round"]
+                record["score"] = event["data"]["review"].get("score", 0)
+                code_raw = event["data"]["code"]
+            elif phase == "final_code_update":
+                review = event["content"].get("review") or {}
+                record["score"] = review.get("score", record["score"])
+            elif phase == "timing":
+                stage = event["content"]["stage"]
+                record["timings"][stage] = round(record["timings"].get(stage, 0.0) + event["content"]["seconds"], 3)
+            elif phase == "failure_report":
+                failed = True
+            elif phase == "done":
+                finished = True
+    except Exception as e:
+        record["error"] = str(e)
+
+    record["code"] = extract_code_content(code_raw)
+    record["passed"] = finished and not failed and record["error"] is None
+    record["elapsed"] = round(time.perf_counter() - start, 3)
+    return record
+
+
+async def run_batch(tasks_file, output_file, concurrency=4):
+    """
+    异步生成器：按完成顺序产出结果记录。
+    所有任务共享同一进程内的 LLM 客户端与模块级缓存，并发度由信号量限制。
+    """
+    tasks = load_tasks(tasks_file)
+    finished = load_finished_ids(output_file)
+    pending = [t for t in tasks if t["id"] not in finished]
+    if finished:
+        print(f">> Batch: 断点续跑，跳过 {len(tasks) - len(pending)} 个已完成任务")
+
+    # 上次被中断时最后一行可能只写了一半，先补上换行，避免新记录接在残行后面
+    if os.path.exists(output_file) and os.path.getsize(output_file) > 0:
+        with open(output_file, "rb+") as f:
+            f.seek(-1, os.SEEK_END)
+            if f.read(1) != b"\n":
+                f.write(b"\n")
+
+    semaphore = asyncio.Semaphore(max(1, concurrency))
+    write_lock = asyncio.Lock()
+
+    async def worker(item):
+        async with semaphore:
+            record = await run_single(item["id"], item["task"])
+        async with write_lock:
+            with open(output_file, "a", encoding="utf-8") as f:
+                f.write(json.dumps(record, ensure_ascii=False) + "\n")
+                f.flush()
+        return record
+
+    jobs = [asyncio.create_task(worker(item)) for item in pending]
+    try:
+        for job in asyncio.as_completed(jobs):
+            yield await job
+    finally:
+        for job in jobs:
+            job.cancel()
+
+
+async def _main(args):
+    total = passed = 0
+    async for record in run_batch(args.tasks_file, args.output, args.concurrency):
+        total += 1
+        passed += record["passed"]
+        status = "PASS" if record["passed"] else "FAIL"
+        print(f"[{status}] {record['id']} 轮数={record['rounds']} 耗时={record['elapsed']}s")
+    print(f">> Batch 完成: {passed}/{total} 通过，结果写入 {args.output}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="批量评测 JSONL 任务文件")
+    parser.add_argument("tasks_file", help="任务文件 (JSONL)")
+    parser.add_argument("-o", "--output", default="results.jsonl", help="结果文件 (JSONL)，已存在时断点续跑")
+    parser.add_argument("-c", "--concurrency", type=int, default=4, help="并发任务数")
+    asyncio.run(_main(parser.parse_args()))
@@ -0,0 +1,504 @@
+"""
+静态复杂度预检：在调用 SYSTEM_FEASIBILITY_ANALYST 之前，本地估算用户代码的复杂度，
+并与题面中的数据范围对比。
+
+- 判定超时（省去逆向分析与可行性评估两次 LLM 调用）：题面只给出一个规模变量，
+  所有计数循环都以它为上界、步长为 1，且没有 while、递归、break/return 或位于 if 分支中的内层循环，
+  此时运算量下界可靠，不会误判。
+- 判定可行：只说明复杂度在预算内，算法是否正确仍由 LLM 评估，不节省调用，
+  仅提示 LLM 不必再评估复杂度。
+- 其余情况返回 None，完全交给 LLM。
+
+- Python: 基于 ast（与 enforce_architecture_lock 相同）分析循环嵌套、递归与记忆化。
+- C++: 轻量级 tokenizer，按花括号跟踪循环嵌套、函数体与自调用。
+"""
+import ast
+import math
+import re
+from functools import lru_cache
+
+# 运算量预算：低于 PASS_BUDGET 视为明确可行，高于 FAIL_BUDGET 视为明确超时
+PASS_BUDGET = 1e7
+FAIL_BUDGET = 1e11
+# 循环上界为不超过该值的常量时视为 O(1) 循环（如 for i in range(26)）
+CONST_LOOP_LIMIT = 1000
+
+MEMO_NAMES = re.compile(r"memo|cache|dp|lru_cache", re.IGNORECASE)
+VISITED_NAMES = re.compile(r"vis|used|seen", re.IGNORECASE)
+LOG_CONTAINERS = {"heapq", "bisect", "sorted", "sort", "SortedList",
+                  "map", "set", "multiset", "multimap", "priority_queue",
+                  "lower_bound", "upper_bound", "binary_search"}
+PY_CONTAINERS = {"heapq", "bisect", "deque", "Counter", "defaultdict", "OrderedDict", "SortedList",
+                 "set", "dict", "sorted"}
+CPP_CONTAINERS = {"vector", "map", "set", "multiset", "multimap", "unordered_map", "unordered_set",
+                  "priority_queue", "queue", "stack", "deque", "bitset",
+                  "sort", "lower_bound", "upper_bound", "binary_search"}
+CPP_KEYWORDS = {"if", "for", "while", "switch", "return", "sizeof", "catch", "else", "do"}
+SIZE_VARS = {"n", "m", "q", "len", "length"}
+# 同一规模的不同写法：题面中的“长度”/length 与代码中的 len(...)
+SIZE_ALIASES = {"length": "len", "长度": "len"}
+# 单参数调用时隐含一层线性遍历的 Python 内建函数（如 sum(a[i:j])）
+PY_IMPLICIT_LOOPS = {"sum", "min", "max", "sorted", "any", "all", "list", "set"}
+
+
+def _size_key(name):
+    return SIZE_ALIASES.get(name.lower(), name.lower())
+
+
+def _empty_result():
+    # size_bounded: 所有计数循环都是以 n/m/q 为上界、步长为 1 的简单循环；bound_vars 为用到的上界变量
+    # has_while: 存在非二分的 while / do-while（双指针、while(t--) 等，迭代次数无法静态确定）
+    # conditional: 计数循环内有 break/return，或内层循环位于 if 分支中，实际次数可能远低于上界
+    return {"loop_depth": 0, "log_loops": 0, "recursive": False, "branching": False,
+            "memoized": False, "visited": False, "containers": [],
+            "size_bounded": True, "bound_vars": set(), "has_while": False, "conditional": False}
+
+
+# ==========================================
+# Python (ast)
+# ==========================================
+
+def _is_const_range(node):
+    """for i in range(26) 之类的常量循环。"""
+    if not (isinstance(node, ast.Call) and isinstance(node.func, ast.Name) and node.func.id == "range"):
+        return False
+    return bool(node.args) and all(
+        isinstance(a, ast.Constant) and isinstance(a.value, int) and abs(a.value) <= CONST_LOOP_LIMIT
+        for a in node.args)
+
+
+def _size_expr_var(node):
+    """n、len(a)、n + 1 之类以规模变量为上界的表达式，返回规模变量名，否则返回 None。"""
+    if isinstance(node, ast.Name):
+        return _size_key(node.id) if node.id.lower() in SIZE_VARS else None
+    if isinstance(node, ast.Call) and isinstance(node.func, ast.Name) and node.func.id == "len":
+        return "len"
+    if isinstance(node, ast.BinOp) and isinstance(node.op, (ast.Add, ast.Sub)) and \
+            isinstance(node.right, ast.Constant):
+        return _size_expr_var(node.left)
+    return None
+
+
+def _is_plain_start(node):
+    """循环起点：常量、循环变量或 i + 1 之类，不含规模变量。"""
+    if isinstance(node, ast.UnaryOp) and isinstance(node.op, ast.USub):
+        node = node.operand
+    if isinstance(node, ast.BinOp) and isinstance(node.op, (ast.Add, ast.Sub)) and \
+            isinstance(node.right, ast.Constant):
+        node = node.left
+    if isinstance(node, ast.Name):
+        return node.id.lower() not in SIZE_VARS
+    return isinstance(node, ast.Constant)
+
+
+def _size_range_var(node):
+    """range(n)、range(i + 1, n)、range(n - 1, -1, -1) 之类步长为 1、以规模变量为界的循环，返回规模变量名。"""
+    if not (isinstance(node, ast.Call) and isinstance(node.func, ast.Name) and node.func.id == "range"):
+        return None
+    args = node.args
+    if len(args) == 1:
+        return _size_expr_var(args[0])
+    if len(args) == 2:
+        return _size_expr_var(args[1]) if _is_plain_start(args[0]) else None
+    if len(args) == 3:
+        step = ast.unparse(args[2]).replace(" ", "")
+        if step == "1" and _is_plain_start(args[0]):
+            return _size_expr_var(args[1])
+        if step == "-1" and _is_plain_start(args[1]):
+            return _size_expr_var(args[0])
+    return None
+
+
+def _is_log_while(node):
+    """二分/折半循环：循环体中出现 x //= 2、x >>= 1 或 mid 变量。"""
+    for sub in ast.walk(node):
+        if isinstance(sub, ast.AugAssign) and isinstance(sub.op, (ast.FloorDiv, ast.RShift)):
+            return True
+        if isinstance(sub, ast.Name) and sub.id == "mid" and isinstance(sub.ctx, ast.Store):
+            return True
+    return False
+
+
+def analyze_python(code):
+    tree = ast.parse(code)
+    result = _empty_result()
+
+    def count_loop(iters, depth, guarded):
+        for it in iters:
+            var = _size_range_var(it)
+            if var:
+                result["bound_vars"].add(var)
+            else:
+                result["size_bounded"] = False
+        if iters and depth and guarded:
+            result["conditional"] = True
+
+    # guarded: 自最近一层循环以来位于 if 分支中
+    def walk(node, depth, guarded):
+        for child in ast.iter_child_nodes(node):
+            child_depth, child_guarded = depth, guarded
+            if isinstance(child, (ast.For, ast.AsyncFor)) and not _is_const_range(child.iter):
+                child_depth += 1
+                child_guarded = False
+                count_loop([child.iter], depth, guarded)
+            elif isinstance(child, ast.While):
+                if _is_log_while(child):
+                    result["log_loops"] += 1
+                else:
+                    child_depth += 1
+                    child_guarded = False
+                    result["has_while"] = True
+            elif isinstance(child, (ast.ListComp, ast.SetComp, ast.DictComp, ast.GeneratorExp)):
+                counted = [g.iter for g in child.generators if not _is_const_range(g.iter)]
+                child_depth += len(counted)
+                count_loop(counted, depth, guarded)
+            elif isinstance(child, ast.Call) and isinstance(child.func, ast.Name) and \
+                    child.func.id in PY_IMPLICIT_LOOPS and len(child.args) == 1 and \
+                    isinstance(child.args[0], (ast.Name, ast.Subscript)):
+                child_depth += 1
+                result["size_bounded"] = False
+            elif isinstance(child, (ast.If, ast.IfExp)):
+                child_guarded = True
+            elif isinstance(child, (ast.Break, ast.Return)) and depth:
+                result["conditional"] = True
+            result["loop_depth"] = max(result["loop_depth"], child_depth)
+            walk(child, child_depth, child_guarded)
+
+    walk(tree, 0, False)
+
+    for func in (n for n in ast.walk(tree) if isinstance(n, (ast.FunctionDef, ast.AsyncFunctionDef))):
+        self_calls = [n for n in ast.walk(func)
+                      if isinstance(n, ast.Call) and isinstance(n.func, ast.Name) and n.func.id == func.name]
+        if not self_calls:
+            continue
+        result["recursive"] = True
+        in_loop = any(isinstance(n, (ast.For, ast.While)) and any(c in self_calls for c in ast.walk(n))
+                      for n in ast.walk(func))
+        if len(self_calls) >= 2 or in_loop:
+            result["branching"] = True
+        names = [ast.unparse(d) for d in func.decorator_list] + \
+                [n.id for n in ast.walk(tree) if isinstance(n, ast.Name)]
+        if any(MEMO_NAMES.search(name) for name in names):
+            result["memoized"] = True
+        if any(VISITED_NAMES.search(name) for name in names):
+            result["visited"] = True
+
+    used = {n.id for n in ast.walk(tree) if isinstance(n, ast.Name)} | \
+           {n.attr for n in ast.walk(tree) if isinstance(n, ast.Attribute)} | \
+           {a.name for n in ast.walk(tree) if isinstance(n, (ast.Import, ast.ImportFrom)) for a in n.names} | \
+           {n.module for n in ast.walk(tree) if isinstance(n, ast.ImportFrom) and n.module}
+    result["containers"] = sorted(used & PY_CONTAINERS)
+    return result
+
+
+# ==========================================
+# C++ (tokenizer)
+# ==========================================
+
+CPP_TOKEN = re.compile(r"[A-Za-z_]\w*|\d+(?:\.\d+)?(?:[eE]\d+)?|>>=|<<=|>>|<<|[{}()\[\];]|\S")
+
+
+def tokenize_cpp(code):
+    code = re.sub(r"//[^\n]*|/\*[\s\S]*?\*/", " ", code)
+    code = re.sub(r'"(?:\\.|[^"\\])*"|\'(?:\\.|[^\'\\])*\'', " 0 ", code)
+    code = re.sub(r"^\s*#[^\n]*", " ", code, flags=re.MULTILINE)
+    return CPP_TOKEN.findall(code)
+
+
+def _skip_parens(tokens, i):
+    """tokens[i] == '('，返回匹配 ')' 之后的位置。"""
+    depth = 0
+    while i < len(tokens):
+        if tokens[i] == "(":
+            depth += 1
+        elif tokens[i] == ")":
+            depth -= 1
+            if depth == 0:
+                return i + 1
+        i += 1
+    return i
+
+
+def _is_const_for(header):
+    """for (int i = 0; i < 26; i++) 之类的常量循环。"""
+    parts = " ".join(header).split(";")
+    if len(parts) < 2:
+        return False
+    bound = re.search(r"<\s*=?\s*(\d+)\s*$", parts[1].strip())
+    return bool(bound) and int(bound.group(1)) <= CONST_LOOP_LIMIT
+
+
+def _size_for_var(header):
+    """for (int i = 0; i < n; i++) 之类以 n/m/q 为上界、步长为 1 的循环，返回规模变量名，否则返回 None。"""
+    parts = " ".join(header).split(";")
+    if len(parts) != 3:
+        return None
+    bound = re.fullmatch(r"\w+\s*<\s*=?\s*(\w+)(?:\s*[+-]\s*\d+)?", parts[1].strip())
+    step = re.fullmatch(r"\w+\s*\+\s*\+|\+\s*\+\s*\w+|\w+\s*\+\s*=\s*1", parts[2].strip())
+    if bound and step and bound.group(1).lower() in SIZE_VARS:
+        return _size_key(bound.group(1))
+    return None
+
+
+def analyze_cpp(code):
+    tokens = tokenize_cpp(code)
+    result = _empty_result()
+    used = set(tokens)
+    result["containers"] = sorted(used & CPP_CONTAINERS)
+
+    # 栈中元素: "loop" (花括号循环体) / "stmt" (单语句循环体) / "block" /
+    # "if_block" / "if_stmt" (if/else 分支) / ("func", name)
+    stack = []
+    funcs = {}  # name -> {"calls": int, "in_loop": bool, "names": set}
+    current_func = None
+    single_stmt = ("stmt", "stmt_const", "if_stmt")
+
+    def note_names(start, stop, loop_depth):
+        # 记录函数体内出现的标识符与自调用（包括 if/循环头中的）
+        if not current_func:
+            return
+        info = funcs[current_func]
+        for j in range(start, stop):
+            if re.match(r"[A-Za-z_]\w*$", tokens[j]):
+                info["names"].add(tokens[j])
+                if tokens[j] == current_func and j + 1 < len(tokens) and tokens[j + 1] == "(":
+                    info["calls"] += 1
+                    if loop_depth:
+                        info["in_loop"] = True
+
+    def guarded():
+        # 自最近一层计数循环以来位于 if/else 分支中
+        for frame in reversed(stack):
+            if frame in ("loop", "stmt"):
+                return False
+            if frame in ("if_block", "if_stmt"):
+                return any(f in ("loop", "stmt") for f in stack)
+        return False
+
+    i = 0
+    while i < len(tokens):
+        tok = tokens[i]
+        loop_depth = sum(1 for f in stack if f in ("loop", "stmt"))
+        if tok in ("if", "else"):
+            if tok == "if" and i + 1 < len(tokens) and tokens[i + 1] == "(":
+                end = _skip_parens(tokens, i + 1)
+                note_names(i + 2, end - 1, loop_depth)
+            else:
+                end = i + 1
+            if end < len(tokens) and tokens[end] == "{":
+                stack.append("if_block")
+                i = end + 1
+            else:
+                stack.append("if_stmt")
+                i = end
+            continue
+        if tok in ("break", "return", "goto") and loop_depth:
+            result["conditional"] = True
+        if tok in ("for", "while") and i + 1 < len(tokens) and tokens[i + 1] == "(":
+            end = _skip_parens(tokens, i + 1)
+            header = tokens[i + 2:end - 1]
+            note_names(i + 2, end - 1, loop_depth)
+            nxt = tokens[end] if end < len(tokens) else ";"
+            if nxt == ";":  # do {...} while(...);
+                i = end
+                continue
+            body_end = end
+            if nxt == "{":
+                depth = 0
+                for body_end in range(end, len(tokens)):
+                    depth += tokens[body_end] == "{"
+                    depth -= tokens[body_end] == "}"
+                    if depth == 0:
+                        break
+            body = tokens[end:body_end + 1]
+            is_log = tok == "while" and (">>=" in body or "mid" in body or
+                                         any(body[j] == "/" and body[j + 1:j + 3] == ["=", "2"]
+                                             for j in range(len(body) - 2)))
+            counted = not is_log and not (tok == "for" and _is_const_for(header))
+            if is_log:
+                result["log_loops"] += 1
+            elif tok == "while":
+                result["has_while"] = True
+            elif counted:
+                var = _size_for_var(header)
+                if var:
+                    result["bound_vars"].add(var)
+                else:
+                    result["size_bounded"] = False
+            if counted and loop_depth and guarded():
+                result["conditional"] = True
+            kind = "loop" if counted else "block"
+            if nxt == "{":
+                stack.append(kind)
+                i = end + 1
+            else:
+                stack.append("stmt" if counted else "stmt_const")
+                i = end
+            result["loop_depth"] = max(result["loop_depth"], loop_depth + counted)
+            continue
+        if tok == "do" and i + 1 < len(tokens) and tokens[i + 1] == "{":
+            stack.append("loop")
+            result["has_while"] = True
+            result["loop_depth"] = max(result["loop_depth"], loop_depth + 1)
+            i += 2
+            continue
+        if tok == "{":
+            # 函数定义: name ( ... ) [const] {，且不在其他函数体内
+            j = i - 1
+            while j >= 0 and tokens[j] in ("const", "noexcept", "override"):
+                j -= 1
+            if current_func is None and j >= 0 and tokens[j] == ")":
+                depth, k = 0, j
+                while k >= 0:
+                    depth += tokens[k] == ")"
+                    depth -= tokens[k] == "("
+                    if depth == 0:
+                        break
+                    k -= 1
+                name = tokens[k - 1] if k > 0 else ""
+                if re.match(r"[A-Za-z_]\w*$", name) and name not in CPP_KEYWORDS:
+                    current_func = name
+                    funcs[name] = {"calls": 0, "in_loop": False, "names": set()}
+                    stack.append(("func", name))
+                    i += 1
+                    continue
+            stack.append("block")
+        elif tok == "}":
+            if stack:
+                frame = stack.pop()
+                if isinstance(frame, tuple):
+                    current_func = None
+            while stack and stack[-1] in single_stmt:
+                stack.pop()
+        elif tok == ";":
+            while stack and stack[-1] in single_stmt:
+                stack.pop()
+        else:
+            note_names(i, i + 1, loop_depth)
+        i += 1
+
+    for info in funcs.values():
+        if not info["calls"]:
+            continue
+        result["recursive"] = True
+        if info["calls"] >= 2 or info["in_loop"]:
+            result["branching"] = True
+        if any(MEMO_NAMES.search(n) for n in info["names"]):
+            result["memoized"] = True
+        if any(VISITED_NAMES.search(n) for n in info["names"]):
+            result["visited"] = True
+    return result
+
+
+@lru_cache(maxsize=256)
+def analyze_complexity(code, language):
+    """返回代码的静态特征；解析失败时返回 None。结果按 (code, language) 缓存。"""
+    try:
+        result = analyze_python(code) if language == "python" else analyze_cpp(code)
+    except Exception as e:
+        print(f">> Complexity Analyzer Error: {e}")
+        return None
+    result["bound_vars"] = sorted(result["bound_vars"])
+    result["exponential"] = result["branching"] and not result["memoized"] and not result["visited"]
+    result["log_factor"] = result["log_loops"] > 0 or any(c in LOG_CONTAINERS for c in result["containers"])
+    result["estimate"] = describe_complexity(result)
+    return result
+
+
+def describe_complexity(result):
+    if result["exponential"]:
+        return "O(2^n)"
+    # 非指数递归按多一层线性计
+    degree = result["loop_depth"] + result["recursive"]
+    poly = "1" if degree == 0 else ("n" if degree == 1 else f"n^{degree}")
+    if result["log_factor"]:
+        poly = "log n" if poly == "1" else f"{poly} log n"
+    return f"O({poly})"
+
+
+# ==========================================
+# 数据范围解析
+# ==========================================
+
+def _parse_number(text):
+    text = text.replace(" ", "")
+    m = re.fullmatch(r"(\d+(?:\.\d+)?)\*10\^(\d+)", text)
+    if m:
+        return float(m.group(1)) * 10 ** int(m.group(2))
+    m = re.fullmatch(r"10\^(\d+)", text)
+    if m:
+        return 10.0 ** int(m.group(1))
+    try:
+        return float(text)
+    except ValueError:
+        return None
+
+
+def parse_input_sizes(task_text):
+    """从题面中提取各规模变量（n/m/q/长度）的上界，返回 {变量名: 上界}。"""
+    text = re.sub(r"\\leq?|≤|≦|不超过|不大于", "<=", task_text)
+    text = re.sub(r"\\times|×", "*", text)
+    text = re.sub(r"[{}$]", "", text)
+    text = re.sub(r"(?<=\d),(?=\d{3})", "", text)
+    number = r"\d+(?:\.\d+)?\s*\*\s*10\s*\^\s*\d+|10\s*\^\s*\d+|\d+(?:\.\d+)?[eE]\d+|\d+"
+    sizes = {}
+    for name, value in re.findall(rf"([A-Za-z]+|长度)\s*<=?\s*({number})", text):
+        if name.lower() in SIZE_VARS or name == "长度":
+            parsed = _parse_number(value)
+            if parsed:
+                key = _size_key(name)
+                sizes[key] = max(sizes.get(key, 0), parsed)
+    return sizes
+
+
+def parse_max_input_size(task_text):
+    """所有规模变量中的最大上界，未找到返回 None。"""
+    sizes = parse_input_sizes(task_text)
+    return max(sizes.values()) if sizes else None
+
+
+# ==========================================
+# 可行性预检
+# ==========================================
+
+def static_feasibility_screen(code, language, task_text):
+    """
+    结论明确时返回与 SYSTEM_FEASIBILITY_ANALYST 相同结构的 JSON
+    {"pass", "reason", "recommendation"}（附带 "analysis"），否则返回 None。
+    pass 为 True 只说明复杂度在预算内，算法是否正确仍需 LLM 判断。
+    """
+    analysis = analyze_complexity(code, language)
+    sizes = parse_input_sizes(task_text)
+    if not analysis or not sizes:
+        return None
+    max_n = max(sizes.values())
+    if max_n < 2:
+        return None
+
+    # 只有纯计数循环（上界均为题面给出的规模变量，无 while、无递归）的运算量才能静态确定；
+    # 筛法、双指针、while(t--)、分治递归等交给 LLM
+    countable = analysis["size_bounded"] and not analysis["has_while"] and not analysis["recursive"] and \
+        set(analysis["bound_vars"]) <= set(sizes)
+    if not countable:
+        return None
+
+    degree = analysis["loop_depth"]
+    summary = f"估算 {analysis['estimate']}，数据规模 {'，'.join(f'{k}≤{v:g}' for k, v in sizes.items())}"
+
+    # 上界：每层循环都按最大的规模变量计
+    upper = max_n ** degree * (math.log2(max_n) if analysis["log_factor"] else 1)
+    if upper <= PASS_BUDGET:
+        return {"pass": True, "analysis": analysis, "reason": f"静态分析：{summary}，复杂度在预算内。",
+                "recommendation": ""}
+
+    # 下界：只在题面只有一个规模变量、且没有可能提前结束或被跳过的内层循环时才可靠，否则可能误判
+    if len(sizes) != 1 or analysis["conditional"]:
+        return None
+    lower = max_n ** degree
+    if lower >= FAIL_BUDGET:
+        target = max(int(math.log(1e8) // math.log(max_n)), 1)
+        target_str = "O(n log n)" if target <= 1 else f"O(n^{target}) 或更低"
+        return {"pass": False, "analysis": analysis,
+                "reason": f"静态分析：循环嵌套深度 {degree}，{summary}，运算量约 {lower:.0e}，严重超时。",
+                "recommendation": f"建议将复杂度降至 {target_str}。"}
+    return None
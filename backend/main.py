@@ -1,9 +1,16 @@
+import os
 import json
-from fastapi import FastAPI
+import uuid
+import asyncio
+from fastapi import FastAPI, HTTPException
 from fastapi.middleware.cors import CORSMiddleware
 from fastapi.responses import StreamingResponse
 from pydantic import BaseModel
-from agent_engine import workflow_orchestrator
+from agent_engine import get_llm_stats
+from batch_runner import run_batch, resolve_batch_path, BATCH_MAX_CONCURRENCY
+from run_cache import cached_orchestrator, run_cache
+from sandbox_pool import workspace_pool
+from state_store import store, STATE_BACKEND
 
 app = FastAPI()
 
@@ -18,15 +25,106 @@ app.add_middleware(
 
 class TaskRequest(BaseModel):
     task: str
+    # 命中运行缓存时的回放模式: original / fast / instant / final
+    replay: str = "instant"
+    speed: float = 8.0
+    use_cache: bool = True
 
 
 @app.post("/generate")
 async def generate_stream(request: TaskRequest):
+    run_id = uuid.uuid4().hex
+
+    async def event_generator():
+        # 运行状态写入共享存储，任意 worker 都能通过 /runs/{run_id} 查询
+        # 存储接口是同步的（sqlite/redis），放到线程中执行，避免阻塞事件循环
+        await asyncio.to_thread(store.create_run, run_id,
+                                {"task": request.task, "status": "running", "worker": os.getpid()})
+        yield f"data: {json.dumps({'phase': 'run_id', 'content': run_id})}\n\n"
+        status = "aborted"
+        # 逐 token 的 code_chunk 先攒在内存里，遇到下一个非 chunk 事件时合并成一条写入
+        chunks = []
+        try:
+            # 获取 Agent 产生的数据流
+            async for event_data in cached_orchestrator(request.task, request.replay, request.speed, request.use_cache):
+                if event_data["phase"] == "code_chunk":
+                    chunks.append(event_data["content"])
+                else:
+                    if chunks:
+                        await asyncio.to_thread(store.append_event, run_id,
+                                                {"phase": "code_chunk", "content": "".join(chunks)})
+                        chunks = []
+                    await asyncio.to_thread(store.append_event, run_id, event_data)
+                if event_data["phase"] == "failure_report":
+                    status = "failed"
+                elif event_data["phase"] == "done" and status != "failed":
+                    status = "done"
+                # SSE 格式: data: <json_string>\n\n
+                yield f"data: {json.dumps(event_data, ensure_ascii=False)}\n\n"
+        finally:
+            # 客户端断开时取消会在这里的 await 处再次抛出，导致状态停留在 running；
+            # 收尾只有两次短写入，同步执行保证一定落盘
+            if chunks:
+                store.append_event(run_id, {"phase": "code_chunk", "content": "".join(chunks)})
+            store.update_run(run_id, status=status)
+
+    return StreamingResponse(event_generator(), media_type="text/event-stream")
+
+
+@app.get("/runs/{run_id}")
+async def run_status(run_id: str):
+    run = await asyncio.to_thread(store.get_run, run_id)
+    if not run:
+        raise HTTPException(status_code=404, detail="run not found")
+    return run
+
+
+@app.get("/runs/{run_id}/events")
+async def run_events(run_id: str, since: int = 0):
+    if not await asyncio.to_thread(store.get_run, run_id):
+        raise HTTPException(status_code=404, detail="run not found")
+    return {"run_id": run_id, "since": since, "events": await asyncio.to_thread(store.get_events, run_id, since)}
+
+
+@app.get("/cache/stats")
+async def cache_stats():
+    return await asyncio.to_thread(run_cache.info)
+
+
+@app.get("/llm/stats")
+async def llm_stats():
+    # 前缀缓存命中率与平均首 token 延迟，用于对比提示词布局调整前后的效果
+    return get_llm_stats()
+
+
+@app.get("/sandbox/stats")
+async def sandbox_stats():
+    return workspace_pool.get_metrics()
+
+
+class BatchRequest(BaseModel):
+    # 相对 BATCH_DIR 的文件名
+    tasks_file: str
+    output_file: str = "results.jsonl"
+    concurrency: int = 4
+
+
+@app.post("/batch")
+async def batch_stream(request: BatchRequest):
+    try:
+        tasks_file = resolve_batch_path(request.tasks_file)
+        output_file = resolve_batch_path(request.output_file)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    if not os.path.isfile(tasks_file):
+        raise HTTPException(status_code=404, detail="tasks file not found")
+
     async def event_generator():
-        # 获取 Agent 产生的数据流
-        async for event_data in workflow_orchestrator(request.task):
-            # SSE 格式: data: <json_string>\n\n
-            yield f"data: {json.dumps(event_data, ensure_ascii=False)}\n\n"
+        # 每完成一个任务推送一条结果记录（同时已追加写入 output_file）
+        concurrency = max(1, min(request.concurrency, BATCH_MAX_CONCURRENCY))
+        async for record in run_batch(tasks_file, output_file, concurrency):
+            yield f"data: {json.dumps({'phase': 'batch_result', 'content': record}, ensure_ascii=False)}\n\n"
+        yield f"data: {json.dumps({'phase': 'done', 'content': ''})}\n\n"
 
     return StreamingResponse(event_generator(), media_type="text/event-stream")
 
@@ -34,4 +132,8 @@ async def generate_stream(request: TaskRequest):
 if __name__ == "__main__":
     import uvicorn
 
-    uvicorn.run(app, host="0.0.0.0", port=8000)
\ No newline at end of file
+    workers = int(os.getenv("WEB_CONCURRENCY", "1"))
+    if workers > 1 and not store.shared:
+        print(f">> 警告: STATE_BACKEND={STATE_BACKEND} 为进程内存储，多 worker 间不共享缓存与运行状态")
+    # 多 worker 需以导入字符串方式启动
+    uvicorn.run("main:app", host="0.0.0.0", port=8000, workers=workers)
\ No newline at end of file
@@ -0,0 +1,146 @@
+"""
+整轮运行缓存：以规范化后的 user_task 为键，缓存通过测试的完整运行结果
+（最终代码、审查、流程图、解释）以及压缩后的事件流录像。
+
+命中时按 replay 模式回放录像：
+- original: 按原始节奏回放
+- fast: 按 speed 倍速回放
+- instant: 无等待直接回放全部事件
+- final: 跳过过程事件，只发出最终结果
+
+准入规则：只缓存正常结束且未触发熔断的运行。按压缩后体积做 LRU 淘汰。
+条目保存在 state_store 中，多 worker 部署时共享。
+"""
+import asyncio
+import hashlib
+import json
+import os
+import re
+import time
+import zlib
+
+from agent_engine import workflow_orchestrator, extract_code_content
+from state_store import store
+
+RUN_CACHE_MAX_BYTES = int(os.getenv("RUN_CACHE_MAX_BYTES", str(64 * 1024 * 1024)))
+REPLAY_MODES = ("original", "fast", "instant", "final")
+# 单个事件之间的最长等待，避免原始录像中的长耗时阶段让回放卡住
+MAX_REPLAY_GAP = 2.0
+
+
+def normalize_task(user_task):
+    text = user_task.replace("\r\n", "\n").replace("\r", "\n")
+    lines = [re.sub(r"[ \t]+", " ", line).strip() for line in text.strip().split("\n")]
+    return "\n".join(line for line in lines if line)
+
+
+def task_key(user_task):
+    return hashlib.sha256(normalize_task(user_task).encode("utf-8")).hexdigest()
+
+
+class RunCache:
+    """条目存放在共享状态存储中（见 state_store），多个 worker 共用同一份缓存；命中统计为进程内计数。"""
+
+    def __init__(self, store, max_bytes=RUN_CACHE_MAX_BYTES):
+        self.store = store
+        self.max_bytes = max_bytes
+        self.stats = {"hits": 0, "misses": 0, "admitted": 0, "rejected": 0, "evicted": 0}
+
+    def get(self, key):
+        blob = self.store.cache_get(f"run:{key}")
+        if blob is None:
+            self.stats["misses"] += 1
+            return None
+        self.stats["hits"] += 1
+        return json.loads(zlib.decompress(blob).decode("utf-8"))
+
+    def admit(self, key, summary, recording):
+        """recording: [(相对开始的秒数, event), ...]。未通过的运行不予缓存。"""
+        if not summary.get("passed") or not summary.get("code"):
+            self.stats["rejected"] += 1
+            return False
+        entry = {"summary": summary, "recording": recording, "created": time.time()}
+        blob = zlib.compress(json.dumps(entry, ensure_ascii=False).encode("utf-8"))
+        if len(blob) > self.max_bytes:
+            self.stats["rejected"] += 1
+            return False
+        self.store.cache_put(f"run:{key}", blob)
+        self.stats["admitted"] += 1
+        self.stats["evicted"] += self.store.cache_evict(self.max_bytes)
+        return True
+
+    def info(self):
+        return {**self.stats, **self.store.cache_info(), "max_bytes": self.max_bytes}
+
+
+run_cache = RunCache(store)
+
+
+def summarize_events(recording):
+    """从事件流中归纳最终结果，用于准入判断与 final 模式回放。"""
+    summary = {"passed": False, "code_raw": "", "code": "", "review": None, "diagram": None, "explanation": None}
+    failed = finished = False
+    for _, event in recording:
+        phase = event.get("phase")
+        if phase == "final_code":
+            summary["code_raw"] = event["content"].get("code", "")
+        elif phase == "iteration":
+            summary["code_raw"] = event["data"]["code"]
+        elif phase == "final_code_update":
+            summary["review"] = event["content"].get("review")
+        elif phase == "diagram":
+            summary["diagram"] = event["content"]
+        elif phase == "explanation":
+            summary["explanation"] = event["content"]
+        elif phase == "failure_report":
+            failed = True
+        elif phase == "done":
+            finished = True
+    summary["code"] = extract_code_content(summary["code_raw"])
+    summary["passed"] = finished and not failed
+    return summary
+
+
+def final_events(summary):
+    yield {"phase": "log", "content": "⚡ 命中运行缓存，直接返回最终结果。"}
+    yield {"phase": "final_code", "content": {"code": summary["code_raw"]}}
+    yield {"phase": "final_code_update", "content": {"review": summary["review"]}}
+    if summary["diagram"]:
+        yield {"phase": "diagram", "content": summary["diagram"]}
+    if summary["explanation"]:
+        yield {"phase": "explanation", "content": summary["explanation"]}
+    yield {"phase": "done", "content": ""}
+
+
+async def replay_recording(entry, replay="instant", speed=8.0):
+    if replay == "final":
+        for event in final_events(entry["summary"]):
+            yield event
+        return
+
+    yield {"phase": "log", "content": "⚡ 命中运行缓存，回放历史记录..."}
+    last_offset = 0.0
+    for offset, event in entry["recording"]:
+        if replay in ("original", "fast"):
+            gap = (offset - last_offset) / (speed if replay == "fast" else 1.0)
+            if gap > 0:
+                await asyncio.sleep(min(gap, MAX_REPLAY_GAP))
+        last_offset = offset
+        yield event
+
+
+async def cached_orchestrator(user_task, replay="instant", speed=8.0, use_cache=True):
+    """workflow_orchestrator 的缓存包装：命中则回放，未命中则实时运行并录制。"""
+    key = task_key(user_task)
+    entry = await asyncio.to_thread(run_cache.get, key) if use_cache else None
+    if entry:
+        async for event in replay_recording(entry, replay if replay in REPLAY_MODES else "instant", max(speed, 0.1)):
+            yield event
+        return
+
+    recording = []
+    start = time.perf_counter()
+    async for event in workflow_orchestrator(user_task):
+        recording.append((round(time.perf_counter() - start, 3), event))
+        yield event
+    await asyncio.to_thread(run_cache.admit, key, summarize_events(recording), recording)
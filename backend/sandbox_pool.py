@@ -0,0 +1,152 @@
+"""
+沙箱工作区池：为 SandboxProgram 预先创建固定数量的槽位目录（优先放在 tmpfs /dev/shm 上），
+每次执行借用一个槽位，结束后清空归还，避免在系统临时目录里反复创建/删除文件。
+等待空闲槽位由调用方在事件循环中完成（见 agent_engine.SANDBOX_SLOTS），池本身从不阻塞。
+
+- 每个进程使用独立的 pool-<pid> 目录，多 worker 部署互不干扰
+- 启动时回收已退出进程遗留的 pool-* 目录
+- /dev/shm 常以 noexec 挂载，启动时先探测能否执行其中的文件，不能则回退到系统临时目录
+- get_metrics() 导出占用情况，供 /sandbox/stats 查询
+"""
+import atexit
+import os
+import platform
+import queue
+import shutil
+import subprocess
+import tempfile
+import threading
+import time
+
+
+def _can_exec_in(directory):
+    """在目录中写入并执行一个 shell 桩脚本，检测是否被 noexec 挂载。"""
+    try:
+        fd, stub = tempfile.mkstemp(dir=directory, suffix=".sh")
+    except OSError:
+        return False
+    try:
+        with os.fdopen(fd, "w") as f:
+            f.write("#!/bin/sh\nexit 0\n")
+        os.chmod(stub, 0o700)
+        return subprocess.run([stub], timeout=5).returncode == 0
+    except (OSError, subprocess.SubprocessError):
+        return False
+    finally:
+        try:
+            os.remove(stub)
+        except OSError:
+            pass
+
+
+def _default_root():
+    if os.path.isdir("/dev/shm") and os.access("/dev/shm", os.W_OK) and _can_exec_in("/dev/shm"):
+        return "/dev/shm/code_agent_sandbox"
+    return os.path.join(tempfile.gettempdir(), "code_agent_sandbox")
+
+
+SANDBOX_ROOT = os.getenv("SANDBOX_ROOT") or _default_root()
+SANDBOX_POOL_SIZE = int(os.getenv("SANDBOX_POOL_SIZE", str(os.cpu_count() or 4)))
+# 无法探测进程存活（Windows）时，超过该时长未修改的池目录视为遗留；
+# 存活进程每次借还槽位都会刷新自己池目录的 mtime 作为心跳
+ORPHAN_MAX_AGE = 3600
+
+
+def _pid_alive(pid):
+    if platform.system() == "Windows":
+        return None  # Windows 下 os.kill 会直接结束进程，不能用来探测
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        return True
+    return True
+
+
+class WorkspacePool:
+    def __init__(self, root=SANDBOX_ROOT, size=SANDBOX_POOL_SIZE):
+        self.root = root
+        self.size = max(1, size)
+        self.pool_dir = os.path.join(root, f"pool-{os.getpid()}")
+        self.free = queue.Queue()
+        self.lock = threading.Lock()
+        self.metrics = {"acquired": 0, "in_use": 0, "peak_in_use": 0, "wait_total": 0.0,
+                        "reset_failures": 0, "orphans_removed": 0}
+
+        os.makedirs(root, exist_ok=True)
+        self.metrics["orphans_removed"] = self.collect_orphans()
+        for i in range(self.size):
+            slot = os.path.join(self.pool_dir, f"slot-{i}")
+            os.makedirs(slot, exist_ok=True)
+            self.reset(slot)
+            self.free.put(slot)
+        atexit.register(shutil.rmtree, self.pool_dir, True)
+
+    def collect_orphans(self):
+        removed = 0
+        for name in os.listdir(self.root):
+            path = os.path.join(self.root, name)
+            if not name.startswith("pool-") or path == self.pool_dir:
+                continue
+            try:
+                alive = _pid_alive(int(name[len("pool-"):]))
+            except ValueError:
+                continue
+            if alive is None:
+                alive = time.time() - os.path.getmtime(path) < ORPHAN_MAX_AGE
+            if not alive:
+                shutil.rmtree(path, ignore_errors=True)
+                removed += 1
+        return removed
+
+    def reset(self, slot):
+        """清空槽位内容，保留目录本身。"""
+        for name in os.listdir(slot):
+            path = os.path.join(slot, name)
+            try:
+                if os.path.isdir(path) and not os.path.islink(path):
+                    shutil.rmtree(path)
+                else:
+                    os.remove(path)
+            except OSError:
+                with self.lock:
+                    self.metrics["reset_failures"] += 1
+
+    def touch(self):
+        """刷新池目录 mtime 作为心跳，避免被其他进程当作遗留目录回收。"""
+        try:
+            os.utime(self.pool_dir)
+        except OSError:
+            pass
+
+    def acquire_nowait(self, waited=0.0):
+        """借用一个槽位目录，无空闲槽位时抛出 queue.Empty。waited 为调用方等待槽位的耗时。用完必须 release()。"""
+        path = self.free.get_nowait()
+        # 长时间空闲后池目录仍可能被误删，借出前确保槽位存在
+        os.makedirs(path, exist_ok=True)
+        self.touch()
+        with self.lock:
+            self.metrics["acquired"] += 1
+            self.metrics["in_use"] += 1
+            self.metrics["peak_in_use"] = max(self.metrics["peak_in_use"], self.metrics["in_use"])
+            self.metrics["wait_total"] += waited
+        return path
+
+    def release(self, path):
+        if os.path.isdir(path):
+            self.reset(path)
+        self.touch()
+        with self.lock:
+            self.metrics["in_use"] -= 1
+        self.free.put(path)
+
+    def get_metrics(self):
+        with self.lock:
+            return {**self.metrics, "size": self.size, "root": self.pool_dir,
+                    "tmpfs": self.root.startswith("/dev/shm"),
+                    "occupancy": round(self.metrics["in_use"] / self.size, 3),
+                    "avg_wait": round(self.metrics["wait_total"] / max(self.metrics["acquired"], 1), 4)}
+
+
+workspace_pool = WorkspacePool()
@@ -0,0 +1,268 @@
+"""
+共享运行状态存储：保存运行元数据、事件日志与缓存条目，使多个 uvicorn worker
+可以共享缓存，并由任意 worker 响应任意运行的状态查询。
+
+后端通过环境变量 STATE_BACKEND 选择：
+- memory (默认): 进程内字典，仅适用于单 worker
+- sqlite: 本机文件 (STATE_SQLITE_PATH)，同机多 worker 共享
+- redis: Redis 兼容服务 (REDIS_URL)，可跨节点共享，需安装 redis 包
+
+运行记录有保留上限：memory/sqlite 只保留最近 STATE_MAX_RUNS 条运行及其事件，
+redis 中的运行与事件在最后一次写入 STATE_RUN_TTL 秒后过期。
+接口均为同步调用，在事件循环中使用时应放到线程里执行。
+"""
+import json
+import os
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+
+STATE_BACKEND = os.getenv("STATE_BACKEND", "memory").lower()
+STATE_SQLITE_PATH = os.getenv("STATE_SQLITE_PATH", "agent_state.db")
+REDIS_URL = os.getenv("REDIS_URL", "redis://localhost:6379/0")
+STATE_MAX_RUNS = int(os.getenv("STATE_MAX_RUNS", "1000"))
+STATE_RUN_TTL = int(os.getenv("STATE_RUN_TTL", str(24 * 3600)))
+
+
+class MemoryStore:
+    shared = False
+
+    def __init__(self, max_runs=STATE_MAX_RUNS):
+        self.max_runs = max_runs
+        # 调用方通过 asyncio.to_thread 并发访问，所有方法都需持锁
+        self.lock = threading.Lock()
+        self.runs = OrderedDict()  # 按创建顺序排列，超出 max_runs 时淘汰最早的运行
+        self.events = {}
+        self.cache = OrderedDict()  # key -> bytes，按访问顺序排列
+
+    # --- 运行状态 ---
+    def create_run(self, run_id, meta):
+        with self.lock:
+            self.runs.pop(run_id, None)
+            self.runs[run_id] = {**meta, "run_id": run_id, "created": time.time(), "updated": time.time()}
+            self.events[run_id] = []
+            while len(self.runs) > self.max_runs:
+                old_id, _ = self.runs.popitem(last=False)
+                self.events.pop(old_id, None)
+
+    def update_run(self, run_id, **fields):
+        with self.lock:
+            if run_id in self.runs:
+                self.runs[run_id].update(fields, updated=time.time())
+
+    def get_run(self, run_id):
+        with self.lock:
+            run = self.runs.get(run_id)
+            return {**run, "events": len(self.events.get(run_id, []))} if run else None
+
+    def append_event(self, run_id, event):
+        with self.lock:
+            if run_id in self.runs:
+                self.events[run_id].append(event)
+
+    def get_events(self, run_id, since=0):
+        with self.lock:
+            return self.events.get(run_id, [])[since:]
+
+    # --- 缓存 ---
+    def cache_get(self, key):
+        with self.lock:
+            value = self.cache.get(key)
+            if value is not None:
+                self.cache.move_to_end(key)
+            return value
+
+    def cache_put(self, key, value):
+        with self.lock:
+            self.cache[key] = value
+            self.cache.move_to_end(key)
+
+    def cache_evict(self, max_bytes):
+        """按最久未访问顺序淘汰，直到总体积不超过 max_bytes，返回淘汰条数。"""
+        evicted = 0
+        with self.lock:
+            total = sum(len(v) for v in self.cache.values())
+            while total > max_bytes and self.cache:
+                _, value = self.cache.popitem(last=False)
+                total -= len(value)
+                evicted += 1
+        return evicted
+
+    def cache_info(self):
+        with self.lock:
+            return {"entries": len(self.cache), "bytes": sum(len(v) for v in self.cache.values())}
+
+
+class SqliteStore:
+    shared = True
+
+    def __init__(self, path=STATE_SQLITE_PATH, max_runs=STATE_MAX_RUNS):
+        self.max_runs = max_runs
+        self.lock = threading.Lock()
+        self.conn = sqlite3.connect(path, timeout=30, check_same_thread=False, isolation_level=None)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute("PRAGMA synchronous=NORMAL")
+        self.conn.executescript("""
+            CREATE TABLE IF NOT EXISTS runs (run_id TEXT PRIMARY KEY, meta TEXT, created REAL, updated REAL);
+            CREATE INDEX IF NOT EXISTS runs_created ON runs (created);
+            CREATE TABLE IF NOT EXISTS events (run_id TEXT, seq INTEGER, event TEXT, PRIMARY KEY (run_id, seq));
+            CREATE TABLE IF NOT EXISTS cache (key TEXT PRIMARY KEY, value BLOB, size INTEGER, accessed REAL);
+            CREATE INDEX IF NOT EXISTS cache_accessed ON cache (accessed);
+        """)
+
+    def _execute(self, sql, params=()):
+        with self.lock:
+            return self.conn.execute(sql, params).fetchall()
+
+    def create_run(self, run_id, meta):
+        now = time.time()
+        self._execute("INSERT OR REPLACE INTO runs VALUES (?, ?, ?, ?)",
+                      (run_id, json.dumps(meta, ensure_ascii=False), now, now))
+        self._execute("DELETE FROM events WHERE run_id = ?", (run_id,))
+        self.prune_runs()
+
+    def prune_runs(self):
+        """只保留最近 max_runs 条运行，连同事件一起删除更早的记录。"""
+        with self.lock:
+            stale = self.conn.execute("SELECT run_id FROM runs ORDER BY created DESC LIMIT -1 OFFSET ?",
+                                      (self.max_runs,)).fetchall()
+            for (old_id,) in stale:
+                self.conn.execute("DELETE FROM events WHERE run_id = ?", (old_id,))
+                self.conn.execute("DELETE FROM runs WHERE run_id = ?", (old_id,))
+
+    def update_run(self, run_id, **fields):
+        with self.lock:
+            row = self.conn.execute("SELECT meta FROM runs WHERE run_id = ?", (run_id,)).fetchone()
+            if row:
+                meta = {**json.loads(row[0]), **fields}
+                self.conn.execute("UPDATE runs SET meta = ?, updated = ? WHERE run_id = ?",
+                                  (json.dumps(meta, ensure_ascii=False), time.time(), run_id))
+
+    def get_run(self, run_id):
+        rows = self._execute("SELECT meta, created, updated, "
+                             "(SELECT COUNT(*) FROM events WHERE events.run_id = runs.run_id) "
+                             "FROM runs WHERE run_id = ?", (run_id,))
+        if not rows:
+            return None
+        meta, created, updated, count = rows[0]
+        return {**json.loads(meta), "run_id": run_id, "created": created, "updated": updated, "events": count}
+
+    def append_event(self, run_id, event):
+        self._execute("INSERT INTO events VALUES (?, (SELECT COUNT(*) FROM events WHERE run_id = ?), ?)",
+                      (run_id, run_id, json.dumps(event, ensure_ascii=False)))
+
+    def get_events(self, run_id, since=0):
+        rows = self._execute("SELECT event FROM events WHERE run_id = ? AND seq >= ? ORDER BY seq", (run_id, since))
+        return [json.loads(r[0]) for r in rows]
+
+    def cache_get(self, key):
+        rows = self._execute("SELECT value FROM cache WHERE key = ?", (key,))
+        if not rows:
+            return None
+        self._execute("UPDATE cache SET accessed = ? WHERE key = ?", (time.time(), key))
+        return rows[0][0]
+
+    def cache_put(self, key, value):
+        self._execute("INSERT OR REPLACE INTO cache VALUES (?, ?, ?, ?)", (key, value, len(value), time.time()))
+
+    def cache_evict(self, max_bytes):
+        evicted = 0
+        with self.lock:
+            total = self.conn.execute("SELECT COALESCE(SUM(size), 0) FROM cache").fetchone()[0]
+            for key, size in self.conn.execute("SELECT key, size FROM cache ORDER BY accessed").fetchall():
+                if total <= max_bytes:
+                    break
+                self.conn.execute("DELETE FROM cache WHERE key = ?", (key,))
+                total -= size
+                evicted += 1
+        return evicted
+
+    def cache_info(self):
+        entries, size = self._execute("SELECT COUNT(*), COALESCE(SUM(size), 0) FROM cache")[0]
+        return {"entries": entries, "bytes": size}
+
+
+class RedisStore:
+    shared = True
+
+    def __init__(self, url=REDIS_URL, ttl=STATE_RUN_TTL):
+        import redis
+        self.r = redis.Redis.from_url(url)
+        self.ttl = ttl
+
+    def create_run(self, run_id, meta):
+        now = time.time()
+        pipe = self.r.pipeline()
+        pipe.set(f"run:{run_id}", json.dumps({**meta, "run_id": run_id, "created": now, "updated": now},
+                                             ensure_ascii=False), ex=self.ttl)
+        pipe.delete(f"run:{run_id}:events")
+        pipe.execute()
+
+    def update_run(self, run_id, **fields):
+        raw = self.r.get(f"run:{run_id}")
+        if raw:
+            pipe = self.r.pipeline()
+            pipe.set(f"run:{run_id}", json.dumps({**json.loads(raw), **fields, "updated": time.time()},
+                                                 ensure_ascii=False), ex=self.ttl)
+            pipe.expire(f"run:{run_id}:events", self.ttl)
+            pipe.execute()
+
+    def get_run(self, run_id):
+        raw = self.r.get(f"run:{run_id}")
+        return {**json.loads(raw), "events": self.r.llen(f"run:{run_id}:events")} if raw else None
+
+    def append_event(self, run_id, event):
+        pipe = self.r.pipeline()
+        pipe.rpush(f"run:{run_id}:events", json.dumps(event, ensure_ascii=False))
+        pipe.expire(f"run:{run_id}:events", self.ttl)
+        pipe.execute()
+
+    def get_events(self, run_id, since=0):
+        return [json.loads(e) for e in self.r.lrange(f"run:{run_id}:events", since, -1)]
+
+    def cache_get(self, key):
+        value = self.r.get(f"cache:{key}")
+        if value is not None:
+            self.r.zadd("cache:lru", {key: time.time()})
+        return value
+
+    def cache_put(self, key, value):
+        pipe = self.r.pipeline()
+        pipe.set(f"cache:{key}", value)
+        pipe.zadd("cache:lru", {key: time.time()})
+        pipe.hset("cache:size", key, len(value))
+        pipe.execute()
+
+    def cache_evict(self, max_bytes):
+        evicted = 0
+        total = sum(int(v) for v in self.r.hvals("cache:size"))
+        for key in self.r.zrange("cache:lru", 0, -1):
+            if total <= max_bytes:
+                break
+            key = key.decode()
+            total -= int(self.r.hget("cache:size", key) or 0)
+            pipe = self.r.pipeline()
+            pipe.delete(f"cache:{key}")
+            pipe.zrem("cache:lru", key)
+            pipe.hdel("cache:size", key)
+            pipe.execute()
+            evicted += 1
+        return evicted
+
+    def cache_info(self):
+        return {"entries": self.r.zcard("cache:lru"), "bytes": sum(int(v) for v in self.r.hvals("cache:size"))}
+
+
+def create_store(backend=STATE_BACKEND):
+    if backend == "sqlite":
+        return SqliteStore()
+    if backend == "redis":
+        try:
+            return RedisStore()
+        except ImportError:
+            print(">> State Store: 未安装 redis 包，回退到进程内存储")
+    return MemoryStore()
+
+
+store = create_store()